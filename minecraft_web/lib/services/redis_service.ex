@@ -11,6 +11,8 @@ defmodule MinecraftWeb.RedisService do
   @error_channel "minecraft:error"
   @details_channel "minecraft:details"
   @external_channel "minecraft:external_server"
+  # Chunk pre-generation progress (JSON)
+  @pregen_channel "minecraft:pregen"
 
   def start_link(_) do
     GenServer.start_link(__MODULE__, nil, name: __MODULE__)
@@ -30,6 +32,7 @@ defmodule MinecraftWeb.RedisService do
     {:ok, _ref3} = Redix.PubSub.subscribe(pubsub, @xterm_channel, self())
     {:ok, _ref4} = Redix.PubSub.subscribe(pubsub, @details_channel, self())
     {:ok, _ref5} = Redix.PubSub.subscribe(pubsub, @external_channel, self())
+    {:ok, _ref6} = Redix.PubSub.subscribe(pubsub, @pregen_channel, self())
 
     {:ok, %{conn: conn, pubsub: pubsub}}
   end
@@ -45,7 +48,10 @@ defmodule MinecraftWeb.RedisService do
              "logs",
              "tailscale_ip",
              "check_running_server",
-             "set_environment"
+             "set_environment",
+             "pregen_stop",
+             "pregen_cancel",
+             "pregen_status"
            ] do
     GenServer.cast(__MODULE__, {:publish, @control_channel, command})
   end
@@ -71,6 +77,11 @@ defmodule MinecraftWeb.RedisService do
     send_command_with_args("set_environment", %{variables: variables})
   end
 
+  # Start or resume chunk pre-generation, e.g. %{center: "spawn", radius: 5000}
+  def start_pregen(options \\ %{}) when is_map(options) do
+    send_command_with_args("pregen_start", options)
+  end
+
   # Publish to Redis
   def handle_cast({:publish, channel, message}, %{conn: conn} = state) do
     case Redix.command(conn, ["PUBLISH", channel, message]) do
@@ -135,6 +146,21 @@ defmodule MinecraftWeb.RedisService do
     {:noreply, state}
   end
 
+  def handle_info(
+        {:redix_pubsub, _pid, _ref, :message, %{channel: @pregen_channel, payload: payload}},
+        state
+      ) do
+    case Jason.decode(payload) do
+      {:ok, progress} ->
+        Phoenix.PubSub.broadcast(MinecraftWeb.PubSub, "minecraft:pregen", {:pregen, progress})
+
+      {:error, reason} ->
+        Logger.error("Invalid pre-generation payload: #{inspect(reason)}")
+    end
+
+    {:noreply, state}
+  end
+
   # Handle subscription confirmations
   def handle_info({:redix_pubsub, _pid, _ref, :subscribed, %{channel: channel}}, state) do
     Logger.info("Subscribed to #{channel}")
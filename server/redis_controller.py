@@ -22,11 +22,32 @@ SERVER_SCRIPT = "/usr/local/bin/server.sh"
 MINECRAFT_DIR = "/minecraft"
 # Environment variables file
 ENV_CONFIG_FILE = "/minecraft/env_config.json"
+# Chunk pre-generation progress file (lives with the world so it is synced)
+PREGEN_STATE_FILE = "/minecraft/pregen_state.json"
 
 # Terminal monitoring related
 TERMINAL_MONITOR_ACTIVE = False
 TERMINAL_MONITOR_THREAD = None
 
+# Chunk pre-generation related
+PREGEN_THREAD = None
+PREGEN_STOP_EVENT = None
+PREGEN_LOCK = threading.Lock()
+PREGEN_STATE = {}
+PREGEN_POLL_INTERVAL = 15  # Seconds between scheduler checks
+PREGEN_DEFAULTS = {
+    "world": "minecraft:overworld",
+    "center": "spawn",  # "spawn", "worldborder" or [x, z]
+    "radius": 5000,
+    "shape": "square",
+    "pattern": "concentric",  # Work outward from the center
+    "max_players": 0,  # Pause when more players than this are online
+    "min_tps": 18.0,  # TPS required before starting or continuing work
+    "idle_seconds": 60,  # Quiet time required before (re)starting work
+    # "tps" on Paper/Spigot, "neoforge tps" on NeoForge, "" to skip the check
+    "tps_command": "forge tps",
+}
+
 # Redis channels
 CONTROL_CHANNEL = "minecraft:control"
 STATUS_CHANNEL = "minecraft:status"
@@ -35,6 +56,7 @@ XTERM_CHANNEL = "minecraft:xterm"
 ERROR_CHANNEL = "minecraft:error"
 DETAILS_CHANNEL = "minecraft:details"
 EXTERNAL_CHANNEL = "minecraft:external_server"
+PREGEN_CHANNEL = "minecraft:pregen"
 
 
 # Signal handling for graceful shutdown
@@ -44,6 +66,8 @@ def signal_handler(sig, frame):
         global TERMINAL_MONITOR_ACTIVE
         TERMINAL_MONITOR_ACTIVE = False
         TERMINAL_MONITOR_THREAD.join(timeout=2)
+    if PREGEN_THREAD and PREGEN_THREAD.is_alive():
+        PREGEN_STOP_EVENT.set()
     sys.exit(0)
 
 
@@ -79,6 +103,10 @@ def publish_external_server(message):
     redis_client.publish(EXTERNAL_CHANNEL, message)
 
 
+def publish_pregen(progress):
+    redis_client.publish(PREGEN_CHANNEL, json.dumps(progress))
+
+
 def load_environment_variables():
     try:
         if os.path.exists(ENV_CONFIG_FILE):
@@ -341,24 +369,24 @@ def stop_terminal_monitor():
         print("Stopped terminal monitor thread")
 
 
+def find_server_log_file():
+    # Try to find the server.log file in the minecraft directory
+    for root, dirs, files in os.walk(MINECRAFT_DIR):
+        for file in files:
+            if file == "server.log" or file == "latest.log":
+                return os.path.join(root, file)
+    return None
+
+
 def fetch_server_logs(lines=100):
     try:
-        logs = []
-
-        # Try to find the server.log file in the minecraft directory
-        log_files = []
-        for root, dirs, files in os.walk(MINECRAFT_DIR):
-            for file in files:
-                if file == "server.log" or file == "latest.log":
-                    log_files.append(os.path.join(root, file))
+        log_file = find_server_log_file()
 
-        if not log_files:
+        if not log_file:
             message = "No server log files found"
             publish_log(message)
             return
 
-        # Use the first log file found
-        log_file = log_files[0]
         print(f"Found log file: {log_file}")
 
         # Read the file and get the last N lines
@@ -402,8 +430,7 @@ def send_minecraft_command(text):
         return False
 
     try:
-        cmd = ["tmux", "send-keys", "-t", "gameserver", text, "Enter"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = send_console_keys(text)
 
         if result.returncode == 0:
             publish_log(f"Sent command to Minecraft: {text}")
@@ -416,6 +443,533 @@ def send_minecraft_command(text):
         return False
 
 
+def send_console_keys(text):
+    """Type a command into the gameserver console without any status checks"""
+    cmd = ["tmux", "send-keys", "-t", "gameserver", text, "Enter"]
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+# Chunk pre-generation scheduler
+CHUNKY_PROGRESS_PATTERN = re.compile(
+    r"Task (running|finished) for ([^\s.]+)"
+    r"(?:.*?Processed: (\d+) chunks \(([\d.]+)%\))?"
+    r"(?:.*?Rate: ([\d.]+) cps)?"
+)
+TPS_PATTERNS = [
+    re.compile(r"Overall.*?Mean TPS:\s*([\d.]+)"),  # Forge
+    re.compile(r"Overall:\s*([\d.]+)\s*TPS"),  # NeoForge
+    re.compile(r"TPS from last 1m, 5m, 15m:\s*\*?([\d.]+)"),  # Paper/Spigot
+]
+PREGEN_TASK_KEYS = ["world", "center", "radius", "shape", "pattern"]
+CHUNKY_SHAPES = [
+    "square",
+    "circle",
+    "diamond",
+    "pentagon",
+    "hexagon",
+    "star",
+    "triangle",
+    "rectangle",
+    "ellipse",
+]
+CHUNKY_PATTERNS = ["concentric", "loop", "spiral", "region"]
+# Saved states whose Chunky task is gone, so the next start begins afresh
+PREGEN_ENDED_STATES = ["finished", "cancelled", "error"]
+# Polls to wait for Chunky to report the task before giving up on it
+PREGEN_CONFIRM_POLLS = 4
+
+
+def load_pregen_state():
+    global PREGEN_STATE
+    try:
+        if os.path.exists(PREGEN_STATE_FILE):
+            with open(PREGEN_STATE_FILE, "r") as f:
+                with PREGEN_LOCK:
+                    PREGEN_STATE = {**PREGEN_DEFAULTS, **json.load(f)}
+                print(f"Loaded pre-generation state from {PREGEN_STATE_FILE}")
+                return True
+    except Exception as e:
+        print(f"Error loading pre-generation state: {e}")
+    return False
+
+
+def save_pregen_state():
+    try:
+        with PREGEN_LOCK:
+            state = dict(PREGEN_STATE)
+        tmp_file = PREGEN_STATE_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f, indent=2)
+        # Replace atomically so a crash never leaves a half-written file
+        os.replace(tmp_file, PREGEN_STATE_FILE)
+        return True
+    except Exception as e:
+        print(f"Error saving pre-generation state: {e}")
+        return False
+
+
+def update_pregen_state(**changes):
+    with PREGEN_LOCK:
+        PREGEN_STATE.update(changes)
+        progress = {
+            key: PREGEN_STATE.get(key)
+            for key in [
+                "state",
+                "reason",
+                "world",
+                "center",
+                "radius",
+                "processed",
+                "percent",
+                "chunks_per_second",
+                "players",
+                "tps",
+            ]
+        }
+    publish_pregen(progress)
+
+
+def is_minecraft_port_open():
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(2)
+            return s.connect_ex(("localhost", 25565)) == 0
+    except:
+        return False
+
+
+def get_player_count():
+    try:
+        return JavaServer.lookup("localhost:25565").status().players.online
+    except Exception as e:
+        print(f"Error getting player count: {e}")
+        return None
+
+
+def read_new_log_lines(log_file, offset):
+    """Return complete lines appended to the log since offset and new offset"""
+    try:
+        size = os.path.getsize(log_file)
+        # Start from the end on first read, or after the log was rotated
+        if offset is None or size < offset:
+            return [], size
+        with open(log_file, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # Leave a line that is still being written for the next read
+        complete = data[: data.rfind(b"\n") + 1]
+        lines = complete.decode("utf-8", errors="replace").splitlines()
+        return lines, offset + len(complete)
+    except Exception as e:
+        print(f"Error reading server log: {e}")
+        return [], offset
+
+
+def parse_pregen_log(lines, world, progress):
+    """Update progress from Chunky and TPS lines
+
+    Returns the last TPS seen and whether Chunky reported the world's task.
+    """
+    tps = None
+    task_seen = False
+    for line in lines:
+        for pattern in TPS_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                tps = float(match.group(1))
+                break
+
+        match = CHUNKY_PROGRESS_PATTERN.search(line)
+        if match and match.group(2) == world:
+            task_seen = True
+            if match.group(3):
+                progress["processed"] = int(match.group(3))
+                progress["percent"] = float(match.group(4))
+            if match.group(5):
+                progress["chunks_per_second"] = float(match.group(5))
+            if match.group(1) == "finished":
+                progress["percent"] = 100.0
+    return tps, task_seen
+
+
+def chunky_task_commands(state):
+    """Console commands that configure and start a new Chunky task"""
+    commands = [
+        f"chunky world {state['world']}",
+        f"chunky shape {state['shape']}",
+        f"chunky pattern {state['pattern']}",
+    ]
+    center = state["center"]
+    if center == "worldborder":
+        # Sets both center and radius from the world border
+        commands.append("chunky worldborder")
+    else:
+        if center == "spawn":
+            commands.append("chunky spawn")
+        else:
+            commands.append(f"chunky center {center[0]} {center[1]}")
+        commands.append(f"chunky radius {state['radius']}")
+    commands.extend(["chunky start", "chunky confirm"])
+    return commands
+
+
+def run_pregen_scheduler(stop_event):
+    log_file = None
+    log_offset = None
+    # Whether Chunky is generating; unknown until we tell it after a (re)start
+    chunky_running = None
+    # Polls since "start"/"continue" was sent without Chunky reporting back
+    unconfirmed_polls = None
+    pending_action = None
+    idle_since = None
+
+    def send_keys(text):
+        # Never touch the console once we have been asked to stop
+        if stop_event.is_set():
+            return False
+        send_console_keys(text)
+        return True
+
+    while not stop_event.is_set():
+        try:
+            if not is_minecraft_port_open():
+                log_offset = None
+                chunky_running = None
+                unconfirmed_polls = None
+                idle_since = None
+                if stop_event.is_set():
+                    break
+                update_pregen_state(
+                    state="waiting",
+                    reason="Server is not running",
+                    chunks_per_second=0,
+                    players=None,
+                    tps=None,
+                )
+                stop_event.wait(PREGEN_POLL_INTERVAL)
+                continue
+
+            with PREGEN_LOCK:
+                config = dict(PREGEN_STATE)
+            world = config["world"]
+            # Only published when measured during this poll
+            tps = None
+
+            if log_file is None:
+                log_file = find_server_log_file()
+                if log_file is None:
+                    print("Pre-generation: no server log file found")
+            if log_offset is None and log_file:
+                _, log_offset = read_new_log_lines(log_file, None)
+
+            progress = {
+                "processed": config.get("processed", 0),
+                "percent": config.get("percent", 0.0),
+                "chunks_per_second": config.get("chunks_per_second", 0),
+            }
+            task_seen = False
+            if log_file:
+                lines, log_offset = read_new_log_lines(log_file, log_offset)
+                _, task_seen = parse_pregen_log(lines, world, progress)
+
+            # A missed "Task finished" line still leaves Chunky at 100%
+            if progress["percent"] >= 100:
+                if stop_event.is_set():
+                    break
+                update_pregen_state(
+                    state="finished",
+                    reason="Pre-generation complete",
+                    enabled=False,
+                    processed=progress["processed"],
+                    percent=100.0,
+                    chunks_per_second=0,
+                    tps=None,
+                )
+                save_pregen_state()
+                publish_log(f"Chunk pre-generation of {world} finished")
+                break
+
+            if unconfirmed_polls is not None:
+                if task_seen:
+                    unconfirmed_polls = None
+                else:
+                    unconfirmed_polls += 1
+
+            if (
+                unconfirmed_polls is not None
+                and unconfirmed_polls > PREGEN_CONFIRM_POLLS
+            ):
+                chunky_running = False
+                unconfirmed_polls = None
+                if pending_action == "continue":
+                    # Chunky has nothing to resume, start the task afresh
+                    publish_log(
+                        f"Chunky did not resume {world}, starting a new task"
+                    )
+                    update_pregen_state(task_started=False)
+                    idle_since = None
+                    continue
+
+                if stop_event.is_set():
+                    break
+                reason = (
+                    f"Chunky did not report a task for {world} "
+                    "(is Chunky installed and not silent?)"
+                )
+                update_pregen_state(
+                    state="error",
+                    reason=reason,
+                    enabled=False,
+                    chunks_per_second=0,
+                    tps=None,
+                )
+                save_pregen_state()
+                publish_error(f"Chunk pre-generation failed: {reason}")
+                break
+
+            players = get_player_count()
+
+            busy_reason = None
+            if players is None:
+                busy_reason = "Player count unavailable"
+            elif players > config["max_players"]:
+                busy_reason = f"{players} player(s) online"
+
+            if busy_reason:
+                idle_since = None
+                if chunky_running is not False and send_keys(
+                    f"chunky pause {world}"
+                ):
+                    chunky_running = False
+                    unconfirmed_polls = None
+                state, reason = "paused", busy_reason
+            elif chunky_running is not True:
+                now = time.time()
+                if idle_since is None:
+                    idle_since = now
+                state = "waiting"
+                reason = f"Waiting for {config['idle_seconds']}s of idle time"
+
+                if now - idle_since >= config["idle_seconds"]:
+                    # TPS is only gated before (re)starting: once Chunky runs
+                    # the measured TPS is mostly its own load, and pausing on
+                    # it would just make generation flap on and off.
+                    if config["tps_command"] and log_file:
+                        send_keys(config["tps_command"])
+                        stop_event.wait(2)
+                        lines, log_offset = read_new_log_lines(
+                            log_file, log_offset
+                        )
+                        tps, _ = parse_pregen_log(lines, world, progress)
+
+                    if tps is not None and tps < config["min_tps"]:
+                        # Give the server another idle period to recover
+                        idle_since = now
+                        # Chunky may have resumed on its own after a restart
+                        if chunky_running is None and send_keys(
+                            f"chunky pause {world}"
+                        ):
+                            chunky_running = False
+                        state = "paused"
+                        reason = f"TPS {tps:.1f} below {config['min_tps']}"
+                    elif config.get("task_started"):
+                        if send_keys(f"chunky continue {world}"):
+                            chunky_running = True
+                            pending_action = "continue"
+                            unconfirmed_polls = 0
+                    else:
+                        for command in chunky_task_commands(config):
+                            send_keys(command)
+                        if not stop_event.is_set():
+                            update_pregen_state(task_started=True)
+                            chunky_running = True
+                            pending_action = "start"
+                            unconfirmed_polls = 0
+
+            if chunky_running and unconfirmed_polls is None:
+                state, reason = "running", None
+            elif chunky_running:
+                state = "starting"
+                reason = "Waiting for Chunky to report progress"
+
+            if stop_event.is_set():
+                break
+            update_pregen_state(
+                state=state,
+                reason=reason,
+                processed=progress["processed"],
+                percent=progress["percent"],
+                chunks_per_second=(
+                    progress["chunks_per_second"]
+                    if state == "running"
+                    else 0
+                ),
+                players=players,
+                tps=tps,
+            )
+            save_pregen_state()
+            stop_event.wait(PREGEN_POLL_INTERVAL)
+        except Exception as e:
+            print(f"Error in pre-generation scheduler: {str(e)}")
+            stop_event.wait(PREGEN_POLL_INTERVAL)
+
+    print("Pre-generation scheduler stopped")
+
+
+def start_pregen_scheduler():
+    global PREGEN_THREAD, PREGEN_STOP_EVENT
+    if PREGEN_THREAD and PREGEN_THREAD.is_alive():
+        print("Pre-generation scheduler already running")
+        return
+
+    # Each thread gets its own event so a stopped one can never be revived
+    PREGEN_STOP_EVENT = threading.Event()
+    PREGEN_THREAD = threading.Thread(
+        target=run_pregen_scheduler, args=(PREGEN_STOP_EVENT,)
+    )
+    PREGEN_THREAD.daemon = True
+    PREGEN_THREAD.start()
+    print("Started pre-generation scheduler thread")
+
+
+def stop_pregen_scheduler():
+    """Stop the scheduler thread and pause Chunky; False if it won't exit"""
+    global PREGEN_THREAD
+    if PREGEN_THREAD and PREGEN_THREAD.is_alive():
+        PREGEN_STOP_EVENT.set()
+        PREGEN_THREAD.join(timeout=30)
+        if PREGEN_THREAD.is_alive():
+            publish_error("Pre-generation scheduler did not stop in time")
+            return False
+        PREGEN_THREAD = None
+        print("Stopped pre-generation scheduler thread")
+
+    # Chunky keeps its own task on pause, so "continue" resumes it later
+    with PREGEN_LOCK:
+        world = PREGEN_STATE.get("world")
+    if world and is_minecraft_port_open():
+        send_console_keys(f"chunky pause {world}")
+    return True
+
+
+def resume_pregen_if_enabled():
+    if load_pregen_state() and PREGEN_STATE.get("enabled"):
+        start_pregen_scheduler()
+
+
+def start_pregen(args):
+    with PREGEN_LOCK:
+        previous = dict(PREGEN_STATE) or dict(PREGEN_DEFAULTS)
+
+    state = {**previous}
+    for key in PREGEN_DEFAULTS:
+        if key in args:
+            state[key] = args[key]
+
+    try:
+        state["radius"] = int(state["radius"])
+        state["max_players"] = int(state["max_players"])
+        state["min_tps"] = float(state["min_tps"])
+        state["idle_seconds"] = int(state["idle_seconds"])
+        center = state["center"]
+        if center not in ("spawn", "worldborder"):
+            state["center"] = [int(center[0]), int(center[1])]
+        # Everything below is typed straight into the server console
+        world = state["world"]
+        if not isinstance(world, str) or not re.fullmatch(r"\S+", world):
+            raise ValueError(f"invalid world {world!r}")
+        if state["radius"] <= 0:
+            raise ValueError("radius must be positive")
+        if state["max_players"] < 0:
+            raise ValueError("max_players cannot be negative")
+        if state["idle_seconds"] < 0:
+            raise ValueError("idle_seconds cannot be negative")
+        if state["shape"] not in CHUNKY_SHAPES:
+            raise ValueError(f"unknown shape {state['shape']!r}")
+        if state["pattern"] not in CHUNKY_PATTERNS:
+            raise ValueError(f"unknown pattern {state['pattern']!r}")
+    except (TypeError, ValueError, IndexError, KeyError) as e:
+        publish_error(f"Invalid pre-generation arguments: {str(e)}")
+        return False
+
+    # A different area or an ended run means a brand new Chunky task
+    new_task = previous.get("state") in PREGEN_ENDED_STATES or any(
+        previous.get(key) != state[key] for key in PREGEN_TASK_KEYS
+    )
+    if new_task:
+        # The running thread still believes the old task is generating
+        if not stop_pregen_scheduler():
+            return False
+        old_world = previous.get("world")
+        if (
+            previous.get("task_started")
+            and old_world != state["world"]
+            and is_minecraft_port_open()
+        ):
+            # Nothing would be left to pause the old world's task
+            send_console_keys(f"chunky cancel {old_world}")
+            send_console_keys("chunky confirm")
+        state.update(task_started=False, processed=0, percent=0.0)
+
+    state["enabled"] = True
+    with PREGEN_LOCK:
+        if new_task:
+            PREGEN_STATE.clear()
+            PREGEN_STATE.update(state)
+        else:
+            # Only apply settings so the thread's latest progress is kept
+            PREGEN_STATE.update(
+                {key: state[key] for key in PREGEN_DEFAULTS},
+                enabled=True,
+            )
+    save_pregen_state()
+    start_pregen_scheduler()
+    publish_status(f"Chunk pre-generation enabled for {state['world']}")
+    return True
+
+
+def stop_pregen():
+    if not stop_pregen_scheduler():
+        return
+    if PREGEN_STATE:
+        update_pregen_state(
+            state="stopped",
+            reason="Stopped by user",
+            enabled=False,
+            chunks_per_second=0,
+        )
+        save_pregen_state()
+    publish_status("Chunk pre-generation stopped (progress saved)")
+
+
+def cancel_pregen():
+    if not stop_pregen_scheduler():
+        return
+    if not PREGEN_STATE:
+        load_pregen_state()
+    with PREGEN_LOCK:
+        if not PREGEN_STATE:
+            PREGEN_STATE.update(PREGEN_DEFAULTS)
+        world = PREGEN_STATE["world"]
+    if is_minecraft_port_open():
+        send_console_keys(f"chunky cancel {world}")
+        send_console_keys("chunky confirm")
+    # Keep a tombstone rather than deleting the file: the world sync never
+    # removes files, so an old copy would come back on the next start
+    update_pregen_state(
+        state="cancelled",
+        reason="Cancelled by user",
+        enabled=False,
+        task_started=False,
+        processed=0,
+        percent=0.0,
+        chunks_per_second=0,
+        tps=None,
+    )
+    save_pregen_state()
+    publish_status("Chunk pre-generation cancelled")
+
+
 def start_tailscale():
     try:
         # Check if required environment variables are set
@@ -477,6 +1031,7 @@ def handle_command(command_data):
         output = execute_server_command("start")
         if output:
             start_terminal_monitor()
+            resume_pregen_if_enabled()
 
     elif command == "stop":
         publish_status(
@@ -491,6 +1046,7 @@ def handle_command(command_data):
         output = execute_server_command("restart")
         if output:
             start_terminal_monitor()
+            resume_pregen_if_enabled()
 
     elif command == "status":
         ip = get_tailscale_ip(pub=False)
@@ -581,6 +1137,23 @@ def handle_command(command_data):
         else:
             publish_error("No command text provided")
 
+    elif command == "pregen_start":
+        start_pregen(args or {})
+
+    elif command == "pregen_stop":
+        stop_pregen()
+
+    elif command == "pregen_cancel":
+        cancel_pregen()
+
+    elif command == "pregen_status":
+        if PREGEN_STATE:
+            update_pregen_state()
+        else:
+            publish_pregen(
+                {"state": "idle", "reason": "No pre-generation task"}
+            )
+
     elif command == "set_environment":
         sys.exit(0)
 
@@ -631,6 +1204,9 @@ def listen_for_commands():
     # Start the terminal monitor
     start_terminal_monitor()
 
+    # Resume chunk pre-generation left running before a restart
+    resume_pregen_if_enabled()
+
     # Subscribe to the control channel
     pubsub.subscribe(CONTROL_CHANNEL)
 